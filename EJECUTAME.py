@@ -14,301 +14,631 @@ import time
 from selenium.webdriver.common.keys import Keys
 import shutil
 import os
-from pathlib import Path
-from selenium.webdriver.common.action_chains import ActionChains #para usar scroll into view
+import base64
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException, StaleElementReferenceException, NoSuchWindowException, \
+    TimeoutException
 import sys
+import argparse
+import tempfile
+from pathlib import Path
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def esperarCondicion(condicion, timeout, pollInicial=0.1, pollMax=1.0, factor=1.5):
+    #CHEQUEA LA CONDICION ARRANCANDO CADA 100ms Y ESPACIANDO LOS CHEQUEOS HASTA 1s, ASI SI YA ESTA LISTO
+    #NO SE PIERDE EL SLEEP ENTERO. EL TIEMPO MAXIMO ES EL MISMO QUE EL SLEEP FIJO QUE REEMPLAZA
+    limite = time.monotonic() + timeout
+    espera = pollInicial
+    while not condicion():
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return False
+        time.sleep(min(espera, restante))
+        espera = min(espera * factor, pollMax)
+    return True
+
+
+def esperarNuevaVentana(driver, ventanasAntes, timeout=10):
+    #ESPERA A QUE APAREZCA UNA VENTANA QUE NO ESTABA EN ventanasAntes, SE CAMBIA A ELLA Y LA DEVUELVE.
+    #EL WebDriverWait CHEQUEA CADA 250ms Y SIGUE APENAS SE ABRE, EN VEZ DE ESPERAR UN SLEEP FIJO
+    nueva = WebDriverWait(driver, timeout, poll_frequency=0.25).until(
+        lambda d: next(iter(set(d.window_handles) - set(ventanasAntes)), False))
+    driver.switch_to.window(nueva)
+    return nueva
+
+
+def esperarElemento(driver, localizador, timeout=15, clickable=False):
+    #ESPERA A QUE EL ELEMENTO ESTE VISIBLE (O CLICKEABLE) Y LO DEVUELVE APENAS LO ESTA, CHEQUEANDO CADA 200ms.
+    #localizador ES UNA TUPLA COMO (By.ID, "F1:username"). SI NO APARECE EN timeout SEGUNDOS TIRA TimeoutException
+    condicion = EC.element_to_be_clickable(localizador) if clickable else EC.visibility_of_element_located(localizador)
+    return WebDriverWait(driver, timeout, poll_frequency=0.2,
+                         ignored_exceptions=(StaleElementReferenceException,)).until(condicion)
+
+
+def esperarYMover(origen, destino, timeout):
+    #ESPERA A QUE TERMINE LA DESCARGA Y LA LLEVA A LA CARPETA DEL CLIENTE. CORRE EN SEGUNDO PLANO (NO TOCA
+    #EL DRIVER) MIENTRAS EL PROGRAMA SIGUE CON LA PAGINA SIGUIENTE
+    esperarCondicion(lambda: os.path.exists(origen), timeout)
+    shutil.move(str(origen), str(destino)) #en python 3.8 shutil.move no acepta Path si destino es carpeta
+
+
+def vaciarCarpeta(carpeta):
+    #BORRA LO QUE HAYA QUEDADO EN LA CARPETA DE DESCARGAS (UNA DESCARGA QUE LLEGO TARDE DEL CLIENTE ANTERIOR),
+    #ASI NO SE LA LLEVA EL PROXIMO CLIENTE NI CHROME LE PONE " (1)" A LA NUEVA
+    for archivo in os.scandir(carpeta):
+        try:
+            os.remove(archivo.path)
+        except OSError: #chrome todavia lo tiene abierto
+            pass
+
+
+#SELECTORES Y SCRIPTS QUE SE USAN CON CADA CLIENTE, ARMADOS UNA SOLA VEZ ACA ARRIBA
+xpathRetenciones = "//div[@title='mis_retenciones']"
+xpathAportes = "//div[@title='mis_aportes']"
+xpathNuestraParte = "//div[@title='cgpf']"
+xpathFlechaAnterior = "//a[@class='left-button fa fa-angle-left']"
+
+#LOCALIZADORES PARA esperarElemento
+locUsuario = (By.ID, "F1:username")
+locClave = (By.ID, "F1:password")
+locRetenciones = (By.XPATH, xpathRetenciones)
+locArchivoHistorico = (By.XPATH, "/html/body/form/table/tbody/tr/td/span/div/table/tbody/tr[1]/td/input[2]")
+locFormulario = (By.XPATH,
+    "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody")
+locExportar = (By.XPATH, "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/"
+    "table[3]/tbody/tr/td[2]/table/tbody/tr/td[8]/a")
+locCerrarAportes = (By.XPATH, "/html/body/form/table/tbody/tr[4]/td/input")
+locIngresarAportes = (By.XPATH, "/html/body/form/table/tbody/tr/td/span/div/table/tbody/tr[1]/td[2]/div/input[2]")
+
+#LOS ICONOS DE LOS SEGMENTOS DE NUESTRA PARTE (MISMA CLASE EXACTA QUE EL XPATH ORIGINAL)
+selectorSegmentos = "div[class='circleIcon internal c-1x text-center'] > i"
+
+#MutationObserver QUE TERMINA CUANDO HAY ALGO QUE CUMPLA EL SELECTOR (arguments[0]) Y LA PAGINA PASO arguments[1]
+#MILISEGUNDOS SIN CAMBIAR, ASI NO CORTA CON LOS PRIMEROS ELEMENTOS (O LOS DEL AÑO ANTERIOR) MIENTRAS SIGUEN
+#LLEGANDO DATOS. COMO MUCHO ESPERA 12s
+scriptEsperarSelector = (
+    "var listo = arguments[arguments.length - 1], selector = arguments[0], calma = arguments[1];"
+    "var espera = null, limite = null;"
+    "function terminar(resultado) {"
+    "    observador.disconnect(); clearTimeout(espera); clearTimeout(limite); listo(resultado);"
+    "}"
+    "function revisar() {"
+    "    clearTimeout(espera);"
+    "    espera = setTimeout(function () { if (document.querySelector(selector)) { terminar(true); } }, calma);"
+    "}"
+    "var observador = new MutationObserver(revisar);"
+    "observador.observe(document.body, {childList: true, subtree: true, characterData: true});"
+    "revisar();"
+    "limite = setTimeout(function () { terminar(!!document.querySelector(selector)); }, 12000);")
+
+#CUANTO TIEMPO SIN CAMBIOS EN LA PAGINA ALCANZA PARA DAR POR TERMINADO LO QUE ESTABA CARGANDO
+msPaginaQuieta = 1500
+
+#SI EL BOTON DEL AÑO (arguments[0]) ESTA EN PANTALLA LO CLICKEA Y DEVUELVE true, SINO CLICKEA LA FLECHA
+#(arguments[1]) PARA IR A AÑOS ANTERIORES Y DEVUELVE false. AMBOS SON XPATH
+scriptBuscarAno = (
+    "function buscar(xpath) {"
+    "    return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;"
+    "}"
+    "var ano = buscar(arguments[0]);"
+    "if (ano) { ano.click(); return true; }"
+    "buscar(arguments[1]).click();"
+    "return false;")
+
+#CLICKEA TODOS LOS ELEMENTOS VISIBLES QUE CUMPLAN EL SELECTOR
+scriptClickearVisibles = (
+    "var elementos = document.querySelectorAll(arguments[0]);"
+    "for (var i = 0; i < elementos.length; i++) {"
+    "    if (elementos[i].getClientRects().length > 0) { elementos[i].click(); }"
+    "}")
+
+
+#CARACTERES QUE WINDOWS NO ACEPTA EN UN NOMBRE DE CARPETA (LOS DE CONTROL Y <>:"/\|?*)
+tablaNombreCarpeta = str.maketrans({c: "_" for c in [chr(n) for n in range(32)] + list('<>:"/\\|?*')})
+
+
+def normalizarNombre(nombre):
+    #DEJA EL NOMBRE DEL CONTRIBUYENTE LISTO PARA USAR COMO CARPETA, EL translate LO HACE EN UNA SOLA PASADA
+    return nombre.strip().translate(tablaNombreCarpeta)
+
+
+def escribirFallo(carpetaCliente, mensaje):
+    #DEJA EL MOTIVO DEL ERROR EN fallo.txt DENTRO DE LA CARPETA DEL CLIENTE (write_text LO ABRE, ESCRIBE Y CIERRA)
+    (carpetaCliente / "fallo.txt").write_text(mensaje, encoding="utf-8")
+
+
+def leerContribuyentes(listado):
+    #VA DEVOLVIENDO LOS CLIENTES DEL LISTADO DE A UNO (NOMBRE, CUIT, CLAVE) A MEDIDA QUE LEE EL ARCHIVO, ASI EL
+    #PRIMERO YA SE PUEDE PROCESAR SIN HABER LEIDO LOS DEMAS. CADA CLIENTE SON 4 RENGLONES, EL ULTIMO EN BLANCO
+    nombre = listado.readline().rstrip("\n")
+    #esta va a ser mi constante que cuando se acaba la lista dara False y terminara el programa
+    while nombre != "":
+        usuario = listado.readline().rstrip("\n")
+        contra = listado.readline().rstrip("\n")
+        listado.readline()
+        yield normalizarNombre(nombre), usuario, contra
+        nombre = listado.readline().rstrip("\n")
 
 
-#primero tengo que traer el driver, para eso uso la busco desde el archivo actual
-directorioActual = os.getcwd()
-
-#HACER UN PRINT PONER LISTADO AQUI
-print("INDICACIONES:")
-print()
-print("-Dentro del archivo hay una carpeta llamada PONER EL LISTADO AQUI, dentro hay un archivo con instrucciones"
-      "y otro llamado *listado*")
-print("")
-print("Por favor no cambiar el nombre del archivo *listado*")
-
-
-comienzo = input("PRESIONE ENTER PARA INICIAR EL PROGRAMA")
-
-print("\n")
-
-
-
-
-#ACA CHEQUEO SI EL AÑO QUE ME DIERON ES VALIDO:
-
-sano = str(input("Que año desea evaluar sobre su cliente?: "))
-while sano != "2019" and sano!="2020":
-
-    sano = str(input("Ese año no esta disponible, que año desea evaluar sobre sus clientes?: "))
+def limpiarNavegador(driver, ventanaPrincipal, ventanasAbiertas):
+    #DEJA CHROME COMO RECIEN ABIERTO PARA EL PROXIMO CLIENTE, ASI NO HAY QUE CERRARLO Y VOLVER A ARRANCARLO:
+    #CIERRO LAS VENTANAS QUE ABRIO EL CLIENTE (SE GUARDARON AL ABRIRSE, NO HACE FALTA BUSCARLAS) Y BORRO LAS
+    #COOKIES DE TODOS LOS DOMINIOS (ESO CIERRA LA SESION DE AFIP)
+    for ventana in ventanasAbiertas:
+        try:
+            driver.switch_to.window(ventana)
+            driver.close()
+        except NoSuchWindowException: #la pagina ya la habia cerrado
+            pass
+    driver.switch_to.window(ventanaPrincipal)
+    driver.execute_script("try { window.localStorage.clear(); window.sessionStorage.clear(); } catch (e) {}")
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.get("about:blank")
+
+
+#CADA HILO TIENE SU PROPIO CHROME (UN MISMO DRIVER NO SE PUEDE USAR DESDE DOS HILOS A LA VEZ)
+hilos = threading.local()
+navegadoresAbiertos = []
+carpetasDescargas = []
+
+#CHROME VA JUNTANDO MEMORIA CON EL USO, ASI QUE DESPUES DE ESTOS CLIENTES SE CIERRA Y SE ABRE UNO NUEVO
+usosPorNavegador = 25
+
+#HILO QUE VA ABRIENDO EL CHROME DE REEMPLAZO MIENTRAS EL VIEJO TODAVIA ATIENDE SU ULTIMO CLIENTE
+arranques = ThreadPoolExecutor(max_workers=1)
+
+
+def abrirNavegador(carpetaDescargas):
+    #ABRE UN CHROME NUEVO QUE GUARDA LAS DESCARGAS EN carpetaDescargas
+    opciones = webdriver.ChromeOptions()
+    #LAS DESCARGAS VAN DIRECTO A LA CARPETA, SIN PREGUNTAR DONDE GUARDAR NI FRENAR LOS .xls COMO PELIGROSOS
+    opciones.add_experimental_option("prefs", {"download.default_directory": carpetaDescargas,
+                                               "download.prompt_for_download": False,
+                                               "download.directory_upgrade": True,
+                                               "safebrowsing.enabled": True,
+                                               #NO BAJA IMAGENES NI PIDE PERMISO DE NOTIFICACIONES, NO HACEN FALTA PARA
+                                               #LOS DATOS (LOS ICONOS DE NUESTRA PARTE SON DE FUENTE). LOS CSS SE DEJAN
+                                               #PORQUE LOS SEGMENTOS SE CLICKEAN SEGUN SI SE VEN
+                                               "profile.managed_default_content_settings.images": 2,
+                                               "profile.default_content_setting_values.notifications": 2})
+    #SIN EXTENSIONES NI TRAFICO DE FONDO DE CHROME (SINCRONIZACION, METRICAS, PANTALLA DE PRIMER USO)
+    for argumento in ("--disable-extensions", "--disable-background-networking", "--disable-sync",
+                      "--metrics-recording-only", "--no-first-run"):
+        opciones.add_argument(argumento)
+    #LAS PAGINAS SE DAN POR CARGADAS CON EL HTML ARMADO, SIN ESPERAR CADA RECURSO. LO PRIMERO QUE SE USA DE CADA
+    #PAGINA (LOGIN, MENU, FORMULARIO, EXPORTAR, APORTES, AÑOS) SE ESPERA CON esperarElemento O UN WebDriverWait
+    opciones.set_capability("pageLoadStrategy", "eager")
+    if argumentos.oculto:
+        #EL --headless DE SIEMPRE: EL CHROMEDRIVER 88 QUE VIENE CON EL PROGRAMA NO CONOCE EL --headless=new
+        opciones.add_argument("--headless")
+        opciones.add_argument("--disable-gpu")
+        opciones.add_argument("--window-size=1920,1080")
+    driver = webdriver.Chrome(rutaDriver, options=opciones)
 
+    """
+    #ESTOY PROBANDO SI EN MOZILA TENGO EL MISMO ERROR
+    driver = webdriver.Firefox()
+    
+    """
+    #MARGEN PARA LOS execute_async_script QUE ESPERAN COSAS DE LA PAGINA (EL MAS LARGO CORTA A LOS 12s)
+    driver.set_script_timeout(15)
+    #SI UNA PAGINA DE AFIP SE CUELGA CARGANDO, A LOS 60s TIRA TimeoutException Y ESE CLIENTE QUEDA CON fallo.txt
+    #EN VEZ DE TENER EL HILO TRABADO LOS 5 MINUTOS QUE ESPERA CHROMEDRIVER POR DEFECTO
+    driver.set_page_load_timeout(60)
+    if argumentos.oculto:
+        #SIN VENTANA CHROME NO DESCARGA SI NO SE LO PERMITO EXPLICITAMENTE. CON Browser (Y NO Page) VALE PARA TODAS
+        #LAS VENTANAS QUE SE ABRAN, QUE ES DE DONDE SALEN LAS DESCARGAS DE RETENCIONES Y APORTES
+        driver.execute_cdp_cmd("Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": carpetaDescargas})
+    navegadoresAbiertos.append(driver)
+    return driver
+
+
+def navegadorDelHilo():
+    #DEVUELVE EL CHROME DEL HILO ACTUAL Y SU CARPETA DE DESCARGAS. SE ABRE LA PRIMERA VEZ Y DESPUES SE REUSA.
+    #CADA CHROME DESCARGA EN SU PROPIA CARPETA ASI LOS ARCHIVOS DE DOS CLIENTES A LA VEZ NO SE PISAN
+    if not hasattr(hilos, "driver"):
+        hilos.carpetaDescargas = tempfile.mkdtemp(prefix="afip_descargas_")
+        carpetasDescargas.append(hilos.carpetaDescargas)
+        hilos.driver = abrirNavegador(hilos.carpetaDescargas)
+        hilos.usos = 0
+        hilos.proximo = None
+    elif hilos.usos >= usosPorNavegador:
+        #PRIMERO CONSIGO EL NUEVO Y RECIEN DESPUES CIERRO EL VIEJO: SI EL NUEVO NO ARRANCA, EL HILO SIGUE CON EL
+        #VIEJO MARCADO PARA CAMBIAR Y EL PROXIMO CLIENTE VUELVE A INTENTAR
+        proximo = hilos.proximo
+        hilos.proximo = None
+        #SI EL QUE SE ESTABA ABRIENDO NO ARRANCO, O SI EL CHROME SE CAYO ANTES DE SU ULTIMO CLIENTE Y NO HAY
+        #UNO ABRIENDOSE, LO ABRO ACA
+        if proximo is not None:
+            nuevo = proximo.result()
+        else:
+            nuevo = abrirNavegador(hilos.carpetaDescargas)
+        viejo = hilos.driver
+        hilos.driver = nuevo
+        hilos.usos = 0
+        navegadoresAbiertos.remove(viejo)
+        try:
+            viejo.quit()
+        except WebDriverException: #si el chrome se habia caido ya no hay nada que cerrar
+            pass
+    hilos.usos = hilos.usos + 1
+    #SI ESTE ES SU ULTIMO CLIENTE, EL REEMPLAZO SE VA ABRIENDO AHORA ASI DESPUES NO HAY QUE ESPERAR QUE ARRANQUE
+    if hilos.usos == usosPorNavegador:
+        hilos.proximo = arranques.submit(abrirNavegador, hilos.carpetaDescargas)
+    return hilos.driver, hilos.carpetaDescargas
+
+
+def procesarContribuyente(nombre, usuario, contra):
+    #HACE TODO EL TRAMITE DE UN CLIENTE (LOGIN, RETENCIONES, APORTES Y NUESTRA PARTE) CON EL CHROME DEL HILO.
+    #AL TERMINAR, AUNQUE FALLE, DEJA EL NAVEGADOR LIMPIO PARA EL PROXIMO CLIENTE. DEVUELVE False SI LO SALTEO
+    #CREO LA CARPETA DEL CLIENTE RECIEN CUANDO UN NAVEGADOR LO TOMA, SI YA EXISTE ES QUE YA FUE PROCESADO Y LO
+    #SALTEO SIN USAR EL CHROME. ASI SI SE CORTA EL PROGRAMA, LOS QUE NO LLEGARON A EMPEZAR NO QUEDAN CON CARPETA
+    path = carpetaClientes / nombre
+    try:
+        path.mkdir()
+    except FileExistsError:
+        return False
+    driver, path_to_download_folder = navegadorDelHilo()
+    #LA CARPETA DE DESCARGAS TAMBIEN SE ARMA UNA VEZ, COMO path, Y SE USA PARA TODOS SUS ARCHIVOS
+    carpetaBajadas = Path(path_to_download_folder)
+    #LA PESTAÑA DEL LOGIN ES LA PRINCIPAL DE AFIP, LA GUARDO PARA VOLVER DIRECTO A ELLA SIN PEDIR LA LISTA DE VENTANAS
+    ventanaPrincipal = driver.current_window_handle
+    ventanasAbiertas = []
+    movidaReten = movidaHist = None
+    vaciarCarpeta(path_to_download_folder)
+    try:
 
+        # VOY A LA PAG DE LOGIN AFIP
+        driver.get("https://auth.afip.gob.ar/contribuyente_/login.xhtml")
 
+        username = esperarElemento(driver, locUsuario)
+        username.send_keys(usuario)
+        username.send_keys(Keys.ENTER)
 
+        password = esperarElemento(driver, locClave)
+        password.send_keys(contra)
+        password.send_keys(Keys.ENTER)
 
-rutaListado = "PONER LISTADO AQUI\listado.txt"
-#CHEQUEO QUE ESTE EL ARCHIVO
-fin = "NO"
-while fin=="NO":
+        # RETENCIONNESSSSSSSSSSSSSSSSSSSSSSSSSSSSSSSS
+        #SI A LOS 14 SEGUNDOS (LO QUE ANTES SE ESPERABA FIJO) NO APARECE EL MENU ES QUE NO PUDO ENTRAR
+        try:
+            reten = esperarElemento(driver, locRetenciones, 14)
 
-    try:
-        listado = open( rutaListado, "r")
-        fin = "SI"
-        continue
-    except:
-        end = input("el archivo *listado* no se encuentra en la carpeta o esta con otro nombre, por favor cheque y vuelva a correr"
-              "el programa de cero.")
-        fin = "NO"
+        except TimeoutException:
+            raise RuntimeError("eror al intentar logearse, por favor revisar contraseña")
 
-        sys.exit()
 
 
+        ventanasAntes = driver.window_handles
+        reten.click()
+        # CAMBIO A VENTANA RET
+        ventanaReten = esperarNuevaVentana(driver, ventanasAntes)
+        ventanasAbiertas.append(ventanaReten)
 
-print()
 
-#CREO CARPETA DONDE SE GUARDARAN TODAS LAS CARPETAS
-try:
-    os.mkdir("Listado de clientes")
-except:
-    pass
+        # rellenar info
+        #LA VENTANA YA ESTA PERO LA PAGINA PUEDE SEGUIR CARGANDO (ANTES LO CUBRIAN LOS 5 SEGUNDOS FIJOS)
+        esperarElemento(driver, locFormulario)
+        cuit = driver.find_element_by_xpath("/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[1]/td[2]/select/option[2]")
+        cuit.click()
 
+        impReten = driver.find_element_by_xpath(
+            "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[6]/td[2]/select/option[10]")
+        impReten.click()
 
+        # boton de retencion
+        retBoton = driver.find_element_by_xpath(
+            "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[7]/td[1]/input[1]")
+        retBoton.click()
 
-nombre = listado.readline().rstrip("\n")
-#esta va a ser mi constante que cuando se acaba la lista dara False y terminara el programa
+        # FECHAS
+        fechaDesde = driver.find_element_by_xpath(
+            "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[8]/td[2]/input[1]")
+        fechaDesde.clear()
+        fechaDesde.send_keys("01012019")
 
-while nombre !="" :
+        fechaHasta = driver.find_element_by_xpath(
+            "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[8]/td[2]/input[2]")
+        fechaHasta.clear()
+        fechaHasta.send_keys("31122019")
+        consulta = driver.find_element_by_xpath(
+            "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[13]/td/input")
+        consulta.click()
 
+        try:
+            #LA CONSULTA RECARGA LA PAGINA, ESPERO EL LINK DE EXPORTAR. SI A LOS 10s NO ESTA ES QUE NO HAY RETENCIONES
+            #(TimeoutException TAMBIEN ES WebDriverException)
+            exportar = esperarElemento(driver, locExportar, 10, clickable=True)
+            exportar.click()
+            # ACA ES DONDE REENVIO EL ARCHIVO EN CUESTION A LA CARPETA QUE YO QUIERA
 
-    driver = webdriver.Chrome(directorioActual + "\chromedriver_win32\chromedriver.exe")
-    # abro el driver desde el archivo actual asi no importa donde este la carpeta, el sistema puede correr
 
-    """
-    #ESTOY PROBANDO SI EN MOZILA TENGO EL MISMO ERROR
-    driver = webdriver.Firefox()
-    
-    """
+            #   AHORA BUSCO EL ARCHIVO GUARDADO (EN LA CARPETA DE DESCARGAS DE ESTE CHROME) PARA LLEVARMELO A LA CARPETA QUE CREE
+            pathRetenFrom = carpetaBajadas / "MisRetencionesImpositivas.xls"
+            #LA DESCARGA SE ESPERA Y SE MUEVE EN SEGUNDO PLANO MIENTRAS SIGO CON APORTES
+            #(CHROME LO RENOMBRA RECIEN AL COMPLETARLA)
+            movidaReten = descargas.submit(esperarYMover, pathRetenFrom, path, 6)
 
-    # VOY A LA PAG DE LOGIN AFIP
-    driver.get("https://auth.afip.gob.ar/contribuyente_/login.xhtml")
-    time.sleep(8)
+        except WebDriverException: #no hay retenciones para exportar
+            movidaReten = None
 
-    #aca logre que cree la carpeta donde yo quiero pero siempre saltara un error xq intenta crear "listado de clientes" la cual ya existe
-    try:
-        path = "Listado de clientes\\" + nombre
-        os.mkdir(path)
-    except:
 
-        listado.readline()
-        listado.readline()
-        listado.readline()
-        driver.close()
-        nombre = listado.readline().rstrip("\n")
-    #esta es otra opcion mas larga pero que no da errores
-    #os.mkdir(nombre)
-    #shutil.move(nombre, "Listado de clientes")
 
-    #LEE LOS DATOS DEL LISTADO
-    usuario = listado.readline().rstrip("\n")
-    username = driver.find_element_by_id("F1:username")
-    username.send_keys(usuario)
-    username.send_keys(Keys.ENTER)
 
-    time.sleep(7)
 
-    password = driver.find_element_by_id("F1:password")
-    contra = listado.readline().rstrip("\n")
-    password.send_keys(contra)
-    password.send_keys(Keys.ENTER)
 
-    time.sleep(8)
 
-    # RETENCIONNESSSSSSSSSSSSSSSSSSSSSSSSSSSSSSSS
-    try:
-        time.sleep(6)
-        reten = driver.find_element_by_xpath("//div[@title='mis_retenciones']")
 
-    except:
-        fail = open(path + "\\fallo.txt", "w+")
-        fail.write("eror al intentar logearse, por favor revisar contraseña ")
-        listado.readline()
-        listado.readline()
-        listado.readline()
-        driver.close()
-        nombre = listado.readline().rstrip("\n")
 
 
 
-    reten.click()
-    time.sleep(5)
-    # CAMBIO A VENTANA RET
-    driver.switch_to.window(driver.window_handles[1])
 
 
-    # rellenar info
-    cuit = driver.find_element_by_xpath("/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[1]/td[2]/select/option[2]")
-    cuit.click()
+        # APORTES EN LINEAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA
+        driver.switch_to.window(ventanaPrincipal)
 
-    impReten = driver.find_element_by_xpath(
-        "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[6]/td[2]/select/option[10]")
-    impReten.click()
+        aportes = driver.find_element_by_xpath(xpathAportes)
+        ventanasAntes = driver.window_handles
+        aportes.click()
+        ventanaAportes = esperarNuevaVentana(driver, ventanasAntes)
+        ventanasAbiertas.append(ventanaAportes)
 
-    # boton de retencion
-    retBoton = driver.find_element_by_xpath(
-        "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[7]/td[1]/input[1]")
-    retBoton.click()
+        #IGUAL QUE EN RETENCIONES, ESPERO A QUE CARGUE LA PAGINA (ANTES ERAN 9 SEGUNDOS FIJOS)
+        cerrar = esperarElemento(driver, locCerrarAportes, clickable=True)
+        cerrar.click()
 
-    # FECHAS
-    fechaDesde = driver.find_element_by_xpath(
-        "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[8]/td[2]/input[1]")
-    fechaDesde.clear()
-    fechaDesde.send_keys("01012019")
+        driver.switch_to.window(ventanaAportes)
+        ingresar = esperarElemento(driver, locIngresarAportes, clickable=True)
+        ingresar.click()
+        archHist = esperarElemento(driver, locArchivoHistorico, clickable=True)
+        archHist.click()
+        # muevo el archivo historico
+        pathHistFrom = carpetaBajadas / ("Historico" + usuario + ".xls")
+        #TAMBIEN EN SEGUNDO PLANO, ASI NUESTRA PARTE ARRANCA SIN ESPERAR LA DESCARGA
+        movidaHist = descargas.submit(esperarYMover, pathHistFrom, path, 15)
 
-    fechaHasta = driver.find_element_by_xpath(
-        "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[8]/td[2]/input[2]")
-    fechaHasta.clear()
-    fechaHasta.send_keys("31122019")
-    consulta = driver.find_element_by_xpath(
-        "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/form/table/tbody/tr[13]/td/input")
-    consulta.click()
 
-    try:
-        exportar = driver.find_element_by_xpath(
-            "/html/body/table/tbody/tr/td/table/tbody/tr[2]/td/table/tbody/tr[2]/td[2]/table/tbody/tr/td/table[3]/tbody/tr/td[2]/table/tbody/tr/td[8]/a")
-        exportar.click()
-        # ACA ES DONDE REENVIO EL ARCHIVO EN CUESTION A LA CARPETA QUE YO QUIERA
-        time.sleep(6)
 
 
-        #   AHORA BUSCO EL ARCHIVO GUARDADO PARA LLEVARMELO A LA CARPETA QUE CREE
-        path_to_download_folder = str(os.path.join(Path.home(), "Downloads"))#AK CONSIGO EL PATH A LAS DESCARGAS, DONDE DEBERIA APARECER ARCHIVOS
-        pathRetenFrom = path_to_download_folder + "\MisRetencionesImpositivas.xls"
-        pathRetenTo = directorioActual + "\Listado de clientes\\" + nombre
-        shutil.move( pathRetenFrom , pathRetenTo)
 
-    except:
-        pass
 
 
 
 
+        #NUESTRA PARTEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE
+        driver.switch_to.window(ventanaPrincipal)
+        #NUESTRA PARTE
+        nuestraPar = driver.find_element_by_xpath(xpathNuestraParte)
+        ventanasAntes = driver.window_handles
+        nuestraPar.click()
+        ventanaNuestraParte = esperarNuevaVentana(driver, ventanasAntes)
+        ventanasAbiertas.append(ventanaNuestraParte)
+        #ACA PUEDO PEDIR QUE SE INGRESE AL PRINCIPIO EL AÑO A EVALUAR PARA SER BUSCADO ASI SIRVE EL AÑO PROX
+        #pero de no aparecer en pantalla debo ir a años pasados clickeando flecha
+        #LA VENTANA YA ESTA PERO EL CARRUSEL DE AÑOS PUEDE NO HABER CARGADO: ESPERO A QUE ESTE EL AÑO O LA FLECHA
+        #(ANTES LO CUBRIAN LOS 5 SEGUNDOS FIJOS ANTES DE CAMBIAR DE VENTANA)
+        WebDriverWait(driver, 15, poll_frequency=0.2).until(
+            EC.presence_of_element_located((By.XPATH, xpathAnoOFlecha)))
+        #CADA VUELTA ES UN SOLO execute_script QUE CLICKEA EL AÑO SI ESTA O SINO LA FLECHA
+        #(ANTES ERA UN find QUE FALLABA CON EXCEPCION, OTRO find PARA LA FLECHA Y SU CLICK, Y AL FINAL EL CLICK DEL AÑO).
+        #ENTRE VUELTAS HAY MEDIO SEGUNDO PARA QUE EL CARRUSEL SE ACOMODE, Y SI A LOS 30s NO APARECIO EL AÑO EL CLIENTE
+        #FALLA CON TimeoutException EN VEZ DE QUEDAR CLICKEANDO LA FLECHA PARA SIEMPRE
+        WebDriverWait(driver, 30, poll_frequency=0.5).until(
+            lambda d: d.execute_script(scriptBuscarAno, xpathAno, xpathFlechaAnterior),
+            "no se encontro el año " + sano + " en nuestra parte")
 
+        # EN VEZ DE ESPERAR 12 SEGUNDOS FIJOS, UN MutationObserver EN LA PAGINA AVISA CUANDO ESTAN LOS SEGMENTOS
+        # DEL AÑO Y LA PAGINA DEJO DE CAMBIAR (COMO MUCHO SIGUE ESPERANDO LOS MISMOS 12 SEGUNDOS)
+        driver.execute_async_script(scriptEsperarSelector, selectorSegmentos, msPaginaQuieta)
 
+        # ABRO TODOS LOS SEGMENTOS CON UN SOLO execute_script, ASI ES UN VIAJE AL DRIVER EN VEZ DE
+        # BUSCAR, MOVERSE Y CLICKEAR CADA ICONO POR SEPARADO. SOLO LOS VISIBLES, QUE SON LOS QUE SE PODIAN CLICKEAR
+        driver.execute_script(scriptClickearVisibles, selectorSegmentos)
+        # CADA SEGMENTO ABIERTO PIDE SUS DATOS, ASI QUE ANTES DE IMPRIMIR ESPERO CON EL MISMO MutationObserver A QUE
+        # LA PAGINA DEJE DE CAMBIAR (LOS ICONOS YA ESTAN, ASI QUE SOLO CUENTA LA CALMA, CON EL MISMO TOPE DE 12s)
+        driver.execute_async_script(scriptEsperarSelector, selectorSegmentos, msPaginaQuieta)
 
+        # GUARDO TODA LA PAGINA EN UN SOLO PDF CON EL Page.printToPDF DE CHROME, SIN TENER QUE IR BAJANDO
+        # Y SACANDO UNA CAPTURA POR CADA PEDAZO DE PANTALLA
+        try:
+            pdf = driver.execute_cdp_cmd("Page.printToPDF", {"printBackground": True, "preferCSSPageSize": True})
+            with open(path / "nuestraParte.pdf", "wb") as archivo:
+                archivo.write(base64.b64decode(pdf["data"]))
+
+        except WebDriverException: #si el chrome no deja imprimir con la ventana abierta, saco las capturas como antes
+            driver.execute_script("window.scrollTo(0, 0)")
+            #EL CHROME SE REUSA CON EL PROXIMO CLIENTE, ASI QUE DESPUES DE LAS CAPTURAS LE DEVUELVO SU TAMAÑO
+            tamano = driver.get_window_size()
+            driver.set_window_size(1050, 708)
+            try:
+                maxHeight = driver.execute_script("return document.body.scrollHeight")
+
+                screenHeight = 400
+                actualHeight = i = 0
+
+                while True:
+
+                    driver.get_screenshot_as_file(str(path / ("nuestraParte" + str(i) + ".png")))
+                    # SACA UN SCREEN DEL VIEWPORT
+
+                    i = i + 1
+
+                    actualHeight = actualHeight + screenHeight
+
+                    if actualHeight >= maxHeight:
+                        break
+
+                    else:
+                        driver.execute_script("window.scrollTo(0," + str(actualHeight) + " )")
+                        continue
+
+            finally:
+                driver.set_window_size(tamano["width"], tamano["height"])
+
+        #ANTES DE PASAR AL PROXIMO CLIENTE ME ASEGURO DE QUE SUS DESCARGAS YA SE MOVIERON
+        if movidaReten is not None:
+            try:
+                movidaReten.result()
+            except OSError: #no llego a bajar o ya estaba en la carpeta
+                pass
+        movidaHist.result()
+        return True
+
+    finally:
+        #SI EL CLIENTE FALLO A LA MITAD, ESPERO IGUAL A QUE TERMINEN SUS MOVIDAS ANTES DE QUE EL HILO PASE AL
+        #PROXIMO, ASI NINGUNA QUEDA BUSCANDO ARCHIVOS EN LA CARPETA DE DESCARGAS MIENTRAS YA BAJA OTRO CLIENTE
+        for movida in (movidaReten, movidaHist):
+            if movida is not None:
+                movida.exception()
+        try:
+            limpiarNavegador(driver, ventanaPrincipal, ventanasAbiertas)
+        except WebDriverException: #se cerro o se colgo el chrome (sesion invalida), el proximo cliente usa uno nuevo
+            hilos.usos = usosPorNavegador
 
 
+#LOS AÑOS QUE SE PUEDEN CONSULTAR, EL MENSAJE DE ERROR SE ARMA UNA SOLA VEZ CON ELLOS
+anosDisponibles = ("2019", "2020")
+conjuntoAnos = frozenset(anosDisponibles)
+mensajeAnoInvalido = "Ese año no esta disponible (" + ", ".join(anosDisponibles) + "), que año desea evaluar sobre sus clientes?: "
 
+#OPCIONES POR LINEA DE COMANDOS, PARA PODER CORRERLO PROGRAMADO SIN NADIE QUE APRIETE ENTER
+parser = argparse.ArgumentParser(description="Descarga retenciones, aportes y nuestra parte de AFIP de cada cliente del listado")
+parser.add_argument("--no-wait", action="store_true", help="no esperar que se aprete ENTER para empezar")
+#CON --oculto LOS CHROME CORREN SIN VENTANA (GASTAN MENOS MEMORIA Y NO DIBUJAN NADA). NUESTRA PARTE SE IMPRIME
+#CON Page.printToPDF, QUE SIN VENTANA SI FUNCIONA. SIN LA OPCION SE VEN, PARA PODER SEGUIR LO QUE VA HACIENDO
+parser.add_argument("--oculto", action="store_true", help="correr los navegadores sin ventana")
+parser.add_argument("--año", dest="ano", choices=anosDisponibles, help="año a evaluar, asi no se pregunta al empezar")
+argumentos = parser.parse_args()
 
+#SOLO SE FRENA A ESPERAR ENTER SI HAY ALGUIEN EN LA CONSOLA Y NO SE PIDIO LO CONTRARIO
+interactivo = sys.stdin.isatty() and not argumentos.no_wait
 
+#primero tengo que traer el driver, para eso uso la busco desde el archivo actual
+directorioActual = os.getcwd()
+# abro el driver desde el archivo actual asi no importa donde este la carpeta, el sistema puede correr
+#(LA RUTA SE ARMA UNA VEZ Y LA USAN TODOS LOS CHROME QUE SE ABRAN)
+rutaDriver = os.path.join(directorioActual, "chromedriver_win32", "chromedriver.exe")
+#CARPETA DONDE VA LA CARPETA DE CADA CLIENTE, SE ARMA UNA VEZ Y DESPUES SE LE AGREGA EL NOMBRE CON /
+carpetaClientes = Path(directorioActual) / "Listado de clientes"
 
-    # APORTES EN LINEAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA
-    driver.switch_to.window(driver.window_handles[0])
+#HACER UN PRINT PONER LISTADO AQUI
+print("INDICACIONES:")
+print()
+print("-Dentro del archivo hay una carpeta llamada PONER EL LISTADO AQUI, dentro hay un archivo con instrucciones"
+      "y otro llamado *listado*")
+print("")
+print("Por favor no cambiar el nombre del archivo *listado*")
 
-    aportes = driver.find_element_by_xpath("//div[@title='mis_aportes']")
-    aportes.click()
-    time.sleep(9)
 
-    driver.switch_to.window(driver.window_handles[2])
-    cerrar = driver.find_element_by_xpath("/html/body/form/table/tbody/tr[4]/td/input")
-    cerrar.click()
+if interactivo:
+    comienzo = input("PRESIONE ENTER PARA INICIAR EL PROGRAMA")
 
-    driver.switch_to.window(driver.window_handles[2])
-    ingresar = driver.find_element_by_xpath(
-        "/html/body/form/table/tbody/tr/td/span/div/table/tbody/tr[1]/td[2]/div/input[2]")
-    ingresar.click()
-    time.sleep(6)
-    archHist = driver.find_element_by_xpath("/html/body/form/table/tbody/tr/td/span/div/table/tbody/tr[1]/td/input[2]")
-    archHist.click()
-    # muevo el archivo historico
-    time.sleep(15)
-    pathHistFrom = path_to_download_folder + "\Historico" + usuario + ".xls"
-    pathHistTo = directorioActual + "\Listado de clientes\\" + nombre
-    shutil.move(pathHistFrom , pathHistTo)
+print("\n")
 
 
 
 
+#ACA CHEQUEO SI EL AÑO QUE ME DIERON ES VALIDO:
 
+#SI VINO POR LINEA DE COMANDOS YA LO VALIDO argparse, SINO LO PREGUNTO
+if argumentos.ano is not None:
+    sano = argumentos.ano
+else:
+    sano = str(input("Que año desea evaluar sobre su cliente?: "))
+    while sano not in conjuntoAnos:
 
+        sano = str(input(mensajeAnoInvalido))
 
+#EL BOTON DEL AÑO ES EL MISMO PARA TODOS LOS CLIENTES
+xpathAno = "//span[@data-periodo=" + sano + "]"
+#LO QUE ESPERO EN EL CARRUSEL ANTES DE BUSCAR: EL AÑO O LA FLECHA, CUALQUIERA DE LOS DOS
+xpathAnoOFlecha = xpathAno + " | " + xpathFlechaAnterior
 
 
-    #NUESTRA PARTEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEEE
-    driver.switch_to.window(driver.window_handles[0])
-    #NUESTRA PARTE
-    nuestraPar = driver.find_element_by_xpath("//div[@title='cgpf']")
-    nuestraPar.click()
-    time.sleep(5)
-    driver.switch_to.window(driver.window_handles[3])
-    #ACA PUEDO PEDIR QUE SE INGRESE AL PRINCIPIO EL AÑO A EVALUAR PARA SER BUSCADO ASI SIRVE EL AÑO PROX
-    #pero de no aparecer en pantalla debo ir a años pasados clickeando flecha
-    loop = "yes"
-    while loop == "yes":
-        try:
-            ano = driver.find_element_by_xpath("//span[@data-periodo=" + sano + "]")
-            loop = "no"
 
-        except: #si no funca es que es años anteriores
-            arrow = driver.find_element_by_xpath("//a[@class='left-button fa fa-angle-left']")
-            arrow.click()
-            loop = "yes"
 
-    ano.click()
-    time.sleep(12)
 
-    nuestra = []
-    nuestra = driver.find_elements_by_xpath("//div[@class='circleIcon internal c-1x text-center']/i")
-    cantidad = len(nuestra)
+rutaListado = "PONER LISTADO AQUI\listado.txt"
+#CHEQUEO QUE ESTE EL ARCHIVO
+fin = "NO"
+while fin=="NO":
 
-    actions = ActionChains(driver)
+    try:
+        listado = open( rutaListado, "r")
+        fin = "SI"
+        continue
+    except OSError:
+        mensaje = ("el archivo *listado* no se encuentra en la carpeta o esta con otro nombre, por favor cheque y vuelva a correr"
+                   "el programa de cero.")
+        if interactivo:
+            end = input(mensaje)
+        else:
+            print(mensaje)
+        fin = "NO"
 
-    for i in range(0, cantidad):
-        # primero me muevo al segmento en cuestion
+        sys.exit()
 
-        actions.move_to_element(nuestra[i]).perform()
-        nuestra[i].click()
 
-        """"
-        driver.execute_script("arguments[0].scrollIntoView();", nuestra[i])
-        en caso de que no funque esta es otra forma
-        """
 
-    # ABRO EL SEGMENTO EN CUESTION
+print()
 
-    enter = driver.execute_script("window.scrollTo(0, 0)")
-    driver.set_window_size(1050, 708)
+#CREO CARPETA DONDE SE GUARDARAN TODAS LAS CARPETAS
+carpetaClientes.mkdir(exist_ok=True)
 
-    maxHeight = driver.execute_script("return document.body.scrollHeight")
 
-    screenHeight = 400
-    actualHeight = i = 0
 
-    while True:
+#CUANTOS CLIENTES SE PROCESAN A LA VEZ, CADA UNO EN SU PROPIO CHROME (CASI TODO EL TIEMPO SE ESTA ESPERANDO
+#A LA PAGINA DE AFIP, ASI QUE VARIOS EN PARALELO TERMINAN MUCHO ANTES QUE DE A UNO)
+navegadoresEnParalelo = min(3, os.cpu_count() or 1)
+clientes = ThreadPoolExecutor(max_workers=navegadoresEnParalelo)
 
-        driver.get_screenshot_as_file("Listado de clientes/" + nombre + "/nuestraParte" + str(i) + ".png")
-        # SACA UN SCREEN DEL VIEWPORT
+#HILOS PARA ESPERAR Y MOVER LAS DESCARGAS SIN FRENAR A LOS NAVEGADORES (CADA CLIENTE PUEDE TENER DOS A LA VEZ)
+descargas = ThreadPoolExecutor(max_workers=2 * navegadoresEnParalelo)
 
-        i = i + 1
+pendientes = {}
+#NOMBRES YA MANDADOS, PARA NO MANDAR DOS VECES A LA MISMA CARPETA UN CLIENTE REPETIDO EN EL LISTADO
+vistos = set()
 
-        actualHeight = actualHeight + screenHeight
+for nombre, usuario, contra in leerContribuyentes(listado):
 
-        if actualHeight >= maxHeight:
-            break
+    #LA CARPETA LA CREA EL HILO QUE LO PROCESA (procesarContribuyente)
+    if nombre in vistos:
+        print("Cliente repetido en el listado, se saltea: " + nombre)
+    else:
+        vistos.add(nombre)
+        pendientes[clientes.submit(procesarContribuyente, nombre, usuario, contra)] = nombre
+    #esta es otra opcion mas larga pero que no da errores
+    #os.mkdir(nombre)
+    #shutil.move(nombre, "Listado de clientes")
 
+#VOY MOSTRANDO CADA CLIENTE A MEDIDA QUE TERMINA. SI UNO FALLA LOS DEMAS SIGUEN Y EL ERROR QUEDA EN SU CARPETA
+terminados = 0
+for pendiente in as_completed(pendientes):
+    terminados = terminados + 1
+    nombre = pendientes[pendiente]
+    try:
+        if pendiente.result():
+            print("Cliente " + str(terminados) + "/" + str(len(pendientes)) + " terminado: " + nombre)
         else:
-            enter = driver.execute_script("window.scrollTo(0," + str(actualHeight) + " )")
-            continue
-
-    listado.readline()
-
+            print("Cliente " + str(terminados) + "/" + str(len(pendientes)) + " ya tenia carpeta, salteado: " + nombre)
+    except Exception as error:
+        #ACA SE ESCRIBEN TODOS LOS fallo.txt, TAMBIEN EL DE LA CONTRASEÑA MAL
+        try:
+            escribirFallo(carpetaClientes / nombre, "error al procesar el cliente: " + str(error))
+        except OSError: #no se llego a crear la carpeta del cliente
+            pass
+        print("Cliente " + str(terminados) + "/" + str(len(pendientes)) + " con error: " + nombre)
+
+clientes.shutdown()
+descargas.shutdown()
+arranques.shutdown()
+for driver in navegadoresAbiertos:
     driver.quit()
-
-
-    nombre = listado.readline().rstrip("\n")
-    #vuelve a comenzar el loop hasta que de falso
+for carpetaDescargas in carpetasDescargas:
+    shutil.rmtree(carpetaDescargas, ignore_errors=True)
 
 print("EL PROGRAMA HA FINALIZADO")
-